@@ -25,4 +25,5 @@ setup(
         "Programming Language :: Python :: Implementation :: PyPy",
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
-    install_requires=['requests', 'easygraphql', 'easyweb3', 'digsig >= 1.216.0, < 2.0.0'])
+    extras_require={'fast': ['orjson']},
+    install_requires=['requests', 'httpx[http2]', 'easyweb3', 'digsig >= 1.216.0, < 2.0.0'])
@@ -1,8 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import asyncio
 import unittest
-from wudder import Wudder, Event, graphn, utils, exceptions
+from wudder import Wudder, AsyncWudderClient, Event, Fragment, EventTypes, graphn, utils, exceptions
 from os import environ
 from tests import env
 import time
@@ -83,11 +84,23 @@ class TestWudder(unittest.TestCase):
             Event(event_dict=event_dict).match(
                 Event(event_dict=self.event_dict)))
 
+    def test_get_events(self):
+        events = self.wudder.get_events([self.evhash, graphn.ZEROS_HASH])
+        self.assertTrue(
+            Event(event_dict=events[0]['event']).match(
+                Event(event_dict=self.event_dict)))
+        self.assertIsNone(events[1])
+
     def test_proof(self):
         proof_data = self.wudder.get_event(self.evhash)['proof_data']
         result = utils.check_proof(proof_data['proof'])
         self.assertEqual(self.evhash, result['verified_hash'])
 
+    def test_get_proof(self):
+        proof = self.wudder.get_proof(self.evhash)
+        result = utils.check_proof(proof.proof)
+        self.assertEqual(self.evhash, result['verified_hash'])
+
     def test_check_ethereum_proof(self):
         proof_data = self.wudder.get_event(self.evhash)['proof_data']
         self.assertTrue(
@@ -118,12 +131,53 @@ class TestWudder(unittest.TestCase):
         except exceptions.NotFoundError:
             self.assertTrue(True)
 
+    def test_iter_trace(self):
+        evhashes = [
+            event['evhash']
+            for event in self.wudder.iter_trace(self.evhash, page_size=2)
+        ]
+        self.wudder.invalidate(self.evhash)
+        trace = self.wudder.get_trace(self.evhash)
+        self.assertTrue(evhashes)
+        self.assertEqual(evhashes,
+                         [event['evhash'] for event in trace['events']])
+
     def test_get_non_existing_trace(self):
-        try:
-            self.wudder.get_trace(graphn.ZEROS_HASH)
-            self.assertTrue(False)
-        except exceptions.NotFoundError:
-            self.assertTrue(True)
+        self.assertIsNone(self.wudder.get_trace(graphn.ZEROS_HASH))
+
+
+
+class TestAsyncWudderClient(unittest.IsolatedAsyncioTestCase):
+    evhash = env.evhash
+
+    async def asyncSetUp(self):
+        self.client = AsyncWudderClient(environ['WUDDER_EMAIL'],
+                                        environ['WUDDER_PASSWORD'],
+                                        environ['GRAPHQL_ENDPOINT'])
+        await self.client.login(environ['WUDDER_EMAIL'],
+                                environ['WUDDER_PASSWORD'])
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_send_event_directly(self):
+        event = Event(fragments=[Fragment('key', 'value')],
+                      event_type=EventTypes.TRACE)
+        evhash = await self.client.send_event_directly('Title', event)
+        self.assertEqual(len(evhash), graphn.HASH_LENGTH)
+
+    async def test_get_event(self):
+        # Both lookups fall in the same batch window and share one request
+        events = await asyncio.gather(self.client.get_event(self.evhash),
+                                      self.client.get_event(graphn.ZEROS_HASH))
+        self.assertEqual(events[0]['evhash'], self.evhash)
+        self.assertIsNone(events[1])
+
+    async def test_close_flushes_pending_events(self):
+        event = asyncio.ensure_future(self.client.get_event(self.evhash))
+        await asyncio.sleep(0)
+        await self.client.close()
+        self.assertEqual((await event)['evhash'], self.evhash)
 
 
 if __name__ == '__main__':
@@ -2,5 +2,6 @@
 # -*- coding: utf-8 -*-
 
 from .wudder import *
+from .async_client import AsyncWudderClient
 
 __version__ = '3.216.0'
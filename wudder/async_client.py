@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from .utils import async_retry, MUTATION_RETRIABLE_ERRORS
+from . import exceptions
+from . import utils
+from .event import Event
+from .graphql import AsyncGraphQL
+from .base_client import BaseWudderClient
+from .proof import Proof
+from . import queries
+import asyncio
+from typing import Dict, Union
+
+
+class AsyncWudderClient(BaseWudderClient):
+    BATCH_WINDOW = 0.05
+    __slots__ = ('_refresh_lock', '_refresh_handle', '_refresh_task',
+                 '_pending_events', '_flush_handle', '_flush_tasks')
+
+    def __init__(self,
+                 email: str,
+                 password: str,
+                 endpoint: str = None,
+                 persisted_queries: bool = False):
+        if endpoint is None:
+            endpoint = self.DEFAULT_GRAPHQL_ENDPOINT
+
+        super().__init__(
+            AsyncGraphQL(endpoint, persisted_queries=persisted_queries))
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_handle = None
+        self._refresh_task = None
+        self._pending_events = {}
+        self._flush_handle = None
+        self._flush_tasks = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        # Queued lookups are still answered before the connections close
+        if self._pending_events:
+            self._flush_events()
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.graphql.close()
+
+    @staticmethod
+    async def create_user(email: str,
+                          password: str,
+                          private_key: str,
+                          endpoint: str = None):
+        if endpoint is None:
+            endpoint = AsyncWudderClient.DEFAULT_GRAPHQL_ENDPOINT
+        graphql = AsyncGraphQL(endpoint)
+        try:
+            await AsyncWudderClient._create_user_call(email, password,
+                                                      private_key, graphql)
+        finally:
+            await graphql.close()
+
+    @async_retry
+    async def login(self, email: str, password: str) -> Dict:
+        try:
+            response = await self._login_call(email, password)
+        except TypeError:
+            raise exceptions.LoginError
+
+        self._update_tokens(response['token'], response['refreshToken'])
+        private_key = response['ethAccount']
+        if private_key:
+            return utils.json_loads(private_key)
+
+    async def update_private_key(self, private_key: dict) -> Dict:
+        private_key_str = utils.ordered_stringify(private_key)
+        response = await self._update_private_key_call(private_key_str)
+        return response['ethAccount']
+
+    async def send_event_directly(self, title: str, event: Event) -> str:
+        response = await self._send_event_directly_call(title, event.dict)
+        return response['evhash']
+
+    async def send_events_directly(self, items: list) -> list:
+        chunks = self._get_items_chunks(items)
+        chunks_responses = await asyncio.gather(
+            *[self._send_events_directly_call(chunk) for chunk in chunks],
+            return_exceptions=True)
+        return AsyncWudderClient._get_evhashes(chunks, chunks_responses)
+
+    async def prepare(self, title: str, event: Event) -> Dict:
+        response = await self._prepare_call(title, event.dict)
+        return AsyncWudderClient._format_prepared(response, response['hash'])
+
+    async def get_prepared(self, tmp_hash: str) -> Dict:
+        try:
+            response = await self._get_prepared_call(tmp_hash)
+        except exceptions.NotFoundError:
+            return None
+        return AsyncWudderClient._format_prepared(response, tmp_hash)
+
+    async def send_prepared(self,
+                            tx: Union[dict, str],
+                            signature: str = None) -> str:
+        # Already stringified transactions are sent verbatim
+        tx_str = tx if isinstance(tx, str) else utils.ordered_stringify(tx)
+        response = await self._send_prepared_call(tx_str, signature)
+        return response['evhash']
+
+    async def get_event(self, evhash: str) -> Dict:
+        response = self._event_cache.get(evhash)
+        if response is None:
+            # Concurrent calls within BATCH_WINDOW are merged into one request
+            response = await self._single_flight(('evidence', evhash),
+                                                 self._enqueue_event, evhash)
+            if response is None:
+                return None
+            self._cache_event(evhash, response)
+        return AsyncWudderClient._format_event(response, evhash)
+
+    async def get_events(self, evhashes: list) -> list:
+        responses, missing = self._get_cached_events(evhashes)
+        chunks = list(utils.chunks(missing, self.MAX_BATCH_SIZE))
+        chunks_responses = await asyncio.gather(
+            *[self._get_events_call(chunk) for chunk in chunks])
+        for chunk, chunk_responses in zip(chunks, chunks_responses):
+            self._add_events(responses, chunk, chunk_responses)
+        return AsyncWudderClient._format_events(responses, evhashes)
+
+    async def get_proof(self, evhash: str) -> Proof:
+        graphn_data = self._get_cached_graphn_data(evhash)
+        if graphn_data is None:
+            try:
+                graphn_data = await self._get_proof_call(evhash)
+            except exceptions.NotFoundError:
+                return None
+            if not graphn_data:
+                return None
+            self._proof_cache.set(evhash, graphn_data)
+        return Proof(graphn_data=graphn_data)
+
+    async def get_trace(self, evhash: str) -> Dict:
+        response = self._trace_cache.get(evhash)
+        if response is None:
+            try:
+                response = await self._single_flight(
+                    ('trace', evhash), self._get_trace_call, evhash)
+            except exceptions.NotFoundError:
+                return None
+            self._cache_trace(evhash, response)
+        return AsyncWudderClient._format_trace(response, evhash)
+
+    async def iter_trace(self, evhash: str, page_size: int = 50):
+        try:
+            evhashes = await self._get_trace_evhashes_call(evhash)
+        except exceptions.NotFoundError:
+            return
+        chunks = list(utils.chunks(evhashes, page_size))
+        next_page = None
+        try:
+            for index, chunk in enumerate(chunks):
+                page = next_page or asyncio.ensure_future(
+                    self.get_events(chunk))
+                # The next page downloads while this one is consumed
+                next_page = None
+                if index + 1 < len(chunks):
+                    next_page = asyncio.ensure_future(
+                        self.get_events(chunks[index + 1]))
+                for event in await page:
+                    if event is not None:
+                        yield event
+        finally:
+            # The consumer may stop early, the prefetched page is dropped
+            if next_page is not None:
+                next_page.cancel()
+                if next_page.done() and not next_page.cancelled():
+                    next_page.exception()
+
+    async def _refresh(self, stale_token: str):
+        async with self._refresh_lock:
+            if self._token != stale_token:
+                return
+            response = await self._refresh_call()
+            self._update_tokens(response['token'], response['refreshToken'])
+
+    def _schedule_refresh(self):
+        if self._refresh_handle is not None:
+            self._refresh_handle.cancel()
+        # A timer on the running loop instead of a sleeping task or thread
+        self._refresh_handle = asyncio.get_running_loop().call_later(
+            self.REFRESH_INTERVAL, self._start_refresh, self._token)
+
+    def _start_refresh(self, stale_token: str):
+        self._refresh_handle = None
+        self._refresh_task = asyncio.ensure_future(self._refresh(stale_token))
+
+    async def _execute(self, query: str, variables: dict):
+        token = self._token
+        data, errors = await self.graphql.execute(query, variables)
+        if self._is_auth_error(errors) and self.refresh_token is not None:
+            await self._refresh(token)
+            data, errors = await self.graphql.execute(query, variables)
+        return data, errors
+
+    def _single_flight(self, key: tuple, method, *args) -> asyncio.Future:
+        # No lock needed: nothing is awaited between the lookup and the insert
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(method(*args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Cancelling one waiter must not cancel the call for the others
+        return asyncio.shield(future)
+
+    def _enqueue_event(self, evhash: str) -> asyncio.Future:
+        future = self._pending_events.get(evhash)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_events[evhash] = future
+        if len(self._pending_events) >= self.MAX_BATCH_SIZE:
+            self._flush_events()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.BATCH_WINDOW,
+                                                 self._flush_events)
+        return future
+
+    def _flush_events(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending_events = self._pending_events
+        self._pending_events = {}
+        task = asyncio.ensure_future(self._resolve_events(pending_events))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _resolve_events(self, pending_events: dict):
+        try:
+            responses = await self._get_events_call(list(pending_events))
+        except Exception as error:
+            for future in pending_events.values():
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for future, response in zip(pending_events.values(), responses):
+            if not future.done():
+                future.set_result(response)
+
+    @staticmethod
+    @async_retry(retriable=MUTATION_RETRIABLE_ERRORS)
+    async def _create_user_call(email: str, password: str, private_key: str,
+                                graphql: AsyncGraphQL) -> Dict:
+        variables = AsyncWudderClient._create_user_variables(
+            email, password, private_key)
+        data, errors = await graphql.execute(queries.CREATE_USER, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['createUser']
+
+    @async_retry
+    async def _login_call(self, email: str, password: str) -> Dict:
+        variables = AsyncWudderClient._login_variables(email, password)
+        data, errors = await self.graphql.execute(queries.LOGIN, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['login']
+
+    @async_retry
+    async def _refresh_call(self) -> Dict:
+        variables = self._refresh_variables()
+        data, errors = await self.graphql.execute(queries.REFRESH_TOKEN,
+                                                  variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['refreshToken']
+
+    @async_retry(retriable=MUTATION_RETRIABLE_ERRORS)
+    async def _update_private_key_call(self, private_key: str) -> Dict:
+        variables = AsyncWudderClient._update_private_key_variables(
+            private_key)
+        data, errors = await self._execute(queries.UPDATE_USER, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['updateUser']
+
+    @async_retry(retriable=MUTATION_RETRIABLE_ERRORS)
+    async def _send_event_directly_call(self, title: str, event: dict) -> Dict:
+        variables = AsyncWudderClient._send_event_directly_variables(
+            title, event)
+        data, errors = await self._execute(queries.CREATE_EVIDENCE, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['createEvidence']
+
+    @async_retry(retriable=MUTATION_RETRIABLE_ERRORS)
+    async def _send_events_directly_call(self, items: list) -> list:
+        variables = AsyncWudderClient._send_events_directly_variables(items)
+        data, errors = await self._execute(
+            queries.bulk_create_evidence(len(items)), variables)
+        return AsyncWudderClient._split_responses(data, errors, len(items))
+
+    @async_retry
+    async def _prepare_call(self, title: str, event: dict) -> Dict:
+        variables = AsyncWudderClient._prepare_variables(title, event)
+        data, errors = await self._execute(queries.PREPARE_EVIDENCE, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['prepareEvidence']
+
+    @async_retry(retriable=MUTATION_RETRIABLE_ERRORS)
+    async def _send_prepared_call(self, tx: str, signature: str) -> str:
+        variables = AsyncWudderClient._send_prepared_variables(tx, signature)
+        data, errors = await self._execute(queries.CONFIRM_PREPARED_EVIDENCE,
+                                           variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['confirmPreparedEvidence']
+
+    @async_retry
+    async def _get_prepared_call(self, tmp_hash: str) -> Dict:
+        variables = AsyncWudderClient._get_prepared_variables(tmp_hash)
+        data, errors = await self._execute(queries.PREPARED_EVIDENCE,
+                                           variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['preparedEvidence']
+
+    @async_retry
+    async def _get_event_call(self, evhash: str) -> Dict:
+        variables = AsyncWudderClient._evhash_variables(evhash)
+        data, errors = await self._execute(queries.EVIDENCE, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['evidence']
+
+    @async_retry
+    async def _get_events_call(self, evhashes: list) -> list:
+        variables = AsyncWudderClient._evhashes_variables(evhashes)
+        data, errors = await self._execute(
+            queries.bulk_evidence(len(evhashes)), variables)
+        return AsyncWudderClient._demux_responses(data, errors, len(evhashes))
+
+    @async_retry
+    async def _get_proof_call(self, evhash: str) -> str:
+        variables = AsyncWudderClient._evhash_variables(evhash)
+        data, errors = await self._execute(queries.GRAPHN_DATA, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['evidence']['graphnData']
+
+    @async_retry
+    async def _get_trace_evhashes_call(self, evhash: str) -> list:
+        variables = AsyncWudderClient._evhash_variables(evhash)
+        data, errors = await self._execute(queries.TRACE_EVHASHES, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return AsyncWudderClient._get_child_evhashes(data['trace'])
+
+    @async_retry
+    async def _get_trace_call(self, evhash: str) -> Dict:
+        variables = AsyncWudderClient._evhash_variables(evhash)
+        data, errors = await self._execute(queries.TRACE, variables)
+        AsyncWudderClient._manage_errors(errors)
+        return data['trace']
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from . import exceptions
+from . import utils
+from .event import Event
+from .cache import LRUCache, TTLCache
+from . import queries
+from typing import Dict
+
+
+# Everything both clients share that does no I/O: caches, variables and
+# the handling of the responses
+class BaseWudderClient:
+    DEFAULT_GRAPHQL_ENDPOINT = 'https://api.pre.wudder.tech/graphql/'
+    MAX_BATCH_SIZE = 50
+    EVENT_CACHE_SIZE = 4096
+    TRACE_CACHE_SIZE = 256
+    TRACE_CACHE_TTL = 60
+    REFRESH_INTERVAL = 900
+    AUTH_ERROR_CODES = (401, 440)
+    ERRORS = {
+        429: exceptions.RateLimitExceededError,
+        404: exceptions.NotFoundError,
+        401: exceptions.AuthError,
+        400: exceptions.BadRequestError,
+        440: exceptions.AuthError,
+    }
+    __slots__ = ('graphql', 'refresh_token', '_token', '_inflight',
+                 '_event_cache', '_trace_cache', '_proof_cache')
+
+    def __init__(self, graphql):
+        self.graphql = graphql
+        self.refresh_token = None
+        self._token = None
+        self._inflight = {}
+        self._event_cache = LRUCache(self.EVENT_CACHE_SIZE)
+        self._trace_cache = TTLCache(self.TRACE_CACHE_TTL,
+                                     self.TRACE_CACHE_SIZE)
+        self._proof_cache = LRUCache(self.EVENT_CACHE_SIZE)
+
+    def invalidate(self, evhash: str):
+        # Traces gain children over time, drop the cached one after writing
+        self._event_cache.pop(evhash)
+        self._trace_cache.pop(evhash)
+        self._proof_cache.pop(evhash)
+
+    def _update_tokens(self, token: str, refresh_token: str):
+        self._token = token
+        self.refresh_token = refresh_token
+        self.graphql.set_headers({'x-jwt-token': token})
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        raise NotImplementedError
+
+    def _cache_event(self, evhash: str, response: dict):
+        # Committed events are immutable, pending ones still lack graphnData.
+        # The raw responses are kept, so every call returns new dicts that
+        # callers are free to modify
+        if response.get('graphnData'):
+            self._event_cache.set(evhash, response)
+
+    def _cache_trace(self, evhash: str, response: dict):
+        self._cache_event(evhash, response['creationEvidence'])
+        for child in response['childs']:
+            self._cache_event(child['evhash'], child)
+        self._trace_cache.set(evhash, response)
+
+    def _get_cached_events(self, evhashes: list):
+        responses = {
+            evhash: self._event_cache.get(evhash)
+            for evhash in evhashes
+        }
+        missing = [
+            evhash for evhash, response in responses.items()
+            if response is None
+        ]
+        return responses, missing
+
+    def _add_events(self, responses: dict, evhashes: list,
+                    events_responses: list):
+        for evhash, response in zip(evhashes, events_responses):
+            if response is not None:
+                self._cache_event(evhash, response)
+                responses[evhash] = response
+
+    def _get_cached_graphn_data(self, evhash: str) -> str:
+        graphn_data = self._proof_cache.get(evhash)
+        if graphn_data is None:
+            response = self._event_cache.get(evhash)
+            if response is not None:
+                graphn_data = response['graphnData']
+        return graphn_data
+
+    def _get_items_chunks(self, items: list) -> list:
+        return [[(title, event.dict) for title, event in chunk]
+                for chunk in utils.chunks(items, self.MAX_BATCH_SIZE)]
+
+    @staticmethod
+    def _get_evhashes(chunks: list, chunks_responses: list) -> list:
+        # A batch that failed as a whole is an exception for all its items
+        evhashes = []
+        errors = {}
+        for chunk, responses in zip(chunks, chunks_responses):
+            if isinstance(responses, Exception):
+                responses = [responses] * len(chunk)
+            for response in responses:
+                if isinstance(response, Exception):
+                    errors[len(evhashes)] = response
+                    evhashes.append(None)
+                else:
+                    evhashes.append(response['evhash'])
+        if errors:
+            raise exceptions.BatchError(evhashes, errors)
+        return evhashes
+
+    @staticmethod
+    def _is_auth_error(errors: list) -> bool:
+        if not errors:
+            return False
+        return errors[0].get('code') in BaseWudderClient.AUTH_ERROR_CODES
+
+    @staticmethod
+    def _format_prepared(response: dict, tmp_hash: str) -> Dict:
+        output_data = {
+            'tx':
+            utils.json_loads(response['formattedTransaction']),
+            'event':
+            Event(event_dict=utils.json_loads(response['preparedContent'])),
+            'hash':
+            tmp_hash,
+            'url':
+            response['url'],
+        }
+        return output_data
+
+    @staticmethod
+    def _format_event(response: dict, evhash: str) -> Dict:
+        # The parsed graphnData dict is the output, no copy is needed
+        graphn_data = response.get('graphnData')
+        event_dict = utils.json_loads(graphn_data) if graphn_data else {}
+        event_dict['event'] = utils.json_loads(
+            response['originalContent'])['content']
+        # Not every query selects the evhash, the output always carries it
+        event_dict['evhash'] = evhash
+        return event_dict
+
+    @staticmethod
+    def _format_events(responses: dict, evhashes: list) -> list:
+        events = []
+        for evhash in evhashes:
+            response = responses[evhash]
+            if response is not None:
+                response = BaseWudderClient._format_event(response, evhash)
+            events.append(response)
+        return events
+
+    @staticmethod
+    def _format_trace(response: dict, evhash: str) -> Dict:
+        return {
+            'creation_event':
+            BaseWudderClient._format_event(response['creationEvidence'],
+                                           evhash),
+            'events': [
+                BaseWudderClient._format_event(child, child['evhash'])
+                for child in response['childs']
+            ],
+        }
+
+    @staticmethod
+    def _get_exception(error: dict) -> Exception:
+        exception = BaseWudderClient.ERRORS.get(error.get('code'),
+                                                exceptions.UnexpectedError)
+        return exception(error)
+
+    @staticmethod
+    def _manage_errors(errors: list):
+        if not errors:
+            return
+
+        raise BaseWudderClient._get_exception(errors[0])
+
+    @staticmethod
+    def _split_responses(data: dict, errors: list, count: int) -> list:
+        # Splits a merged response back into one entry per alias, the
+        # entries that failed are their exception
+        if data is None:
+            # A failing non-null field nulls the whole response
+            BaseWudderClient._manage_errors(errors)
+            raise exceptions.UnexpectedError(errors)
+
+        alias_errors = {}
+        for error in errors or []:
+            path = error.get('path')
+            if not path:
+                BaseWudderClient._manage_errors([error])
+            alias_errors.setdefault(path[0], error)
+
+        responses = []
+        for index in range(count):
+            alias = queries.alias(index)
+            if alias in alias_errors:
+                responses.append(
+                    BaseWudderClient._get_exception(alias_errors[alias]))
+            else:
+                responses.append(data.get(alias))
+        return responses
+
+    @staticmethod
+    def _demux_responses(data: dict, errors: list, count: int) -> list:
+        # Missing entries become None, any other error is raised as usual
+        responses = BaseWudderClient._split_responses(data, errors, count)
+        for index, response in enumerate(responses):
+            if isinstance(response, exceptions.NotFoundError):
+                responses[index] = None
+            elif isinstance(response, Exception):
+                raise response
+        return responses
+
+    @staticmethod
+    def _get_child_evhashes(trace: dict) -> list:
+        return [child['evhash'] for child in trace['childs']]
+
+    @staticmethod
+    def _create_user_variables(email: str, password: str,
+                               private_key: str) -> Dict:
+        return {
+            'user': {
+                'email': email,
+                'ethAccount': utils.ordered_stringify(private_key)
+            },
+            'password': password
+        }
+
+    @staticmethod
+    def _login_variables(email: str, password: str) -> Dict:
+        return {
+            'email': email,
+            'password': password,
+        }
+
+    def _refresh_variables(self) -> Dict:
+        return {
+            'refreshToken': self.refresh_token,
+        }
+
+    @staticmethod
+    def _update_private_key_variables(private_key: str) -> Dict:
+        return {
+            'user': {
+                'ethAccount': private_key
+            },
+        }
+
+    @staticmethod
+    def _send_event_directly_variables(title: str, event: dict) -> Dict:
+        return {
+            'displayName': title,
+            'evidence': {
+                'content': event
+            },
+        }
+
+    @staticmethod
+    def _send_events_directly_variables(items: list) -> Dict:
+        return queries.merge_variables([
+            BaseWudderClient._send_event_directly_variables(title, event)
+            for title, event in items
+        ])
+
+    @staticmethod
+    def _prepare_variables(title: str, event: dict) -> Dict:
+        return {'displayName': title, 'content': event}
+
+    @staticmethod
+    def _send_prepared_variables(tx: str, signature: str) -> Dict:
+        return {
+            'evidence': {
+                'preparedEvidence': tx,
+                'signature': signature
+            },
+        }
+
+    @staticmethod
+    def _get_prepared_variables(tmp_hash: str) -> Dict:
+        return {
+            'hash': tmp_hash,
+        }
+
+    @staticmethod
+    def _evhash_variables(evhash: str) -> Dict:
+        return {
+            'evhash': evhash,
+        }
+
+    @staticmethod
+    def _evhashes_variables(evhashes: list) -> Dict:
+        return queries.merge_variables([{
+            'evhash': evhash
+        } for evhash in evhashes])
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                return None
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class TTLCache:
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expiry, value = self._items[key]
+            except KeyError:
+                return None
+            if expiry < time.monotonic():
+                del self._items[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            now = time.monotonic()
+            self._items[key] = (now + self.ttl, value)
+            self._items.move_to_end(key)
+            # Items are kept in insertion order, so the oldest expire first
+            while len(self._items) > self.maxsize or \
+                    next(iter(self._items.values()))[0] < now:
+                self._items.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._items.pop(key, None)
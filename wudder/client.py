@@ -1,27 +1,37 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from .utils import retry
+from .utils import retry, MUTATION_RETRIABLE_ERRORS
 from . import exceptions
 from . import utils
 from .event import Event, Fragment
-from easygraphql import GraphQL
-from threading import Thread
-import time
-import json
-from typing import Dict
-
-
-class WudderClient:
-    DEFAULT_GRAPHQL_ENDPOINT = 'https://api.pre.wudder.tech/graphql/'
-
-    def __init__(self, email: str, password: str, endpoint: str = None):
+from .graphql import GraphQL
+from .base_client import BaseWudderClient
+from .proof import Proof
+from . import queries
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, Timer
+from typing import Dict, Union
+
+
+class WudderClient(BaseWudderClient):
+    MAX_WORKERS = 8
+    _shared_graphql = {}
+    __slots__ = ('_refresh_lock', '_refresh_timer', '_inflight_lock')
+
+    def __init__(self,
+                 email: str,
+                 password: str,
+                 endpoint: str = None,
+                 persisted_queries: bool = False):
         if endpoint is None:
             endpoint = self.DEFAULT_GRAPHQL_ENDPOINT
 
-        self.graphql = GraphQL(endpoint)
-        self.refresh_token = None
-        Thread(target=self._loop_refresh, daemon=True).start()
+        super().__init__(GraphQL(endpoint,
+                                 persisted_queries=persisted_queries))
+        self._refresh_lock = Lock()
+        self._refresh_timer = None
+        self._inflight_lock = Lock()
 
     @staticmethod
     def create_user(email: str,
@@ -32,6 +42,13 @@ class WudderClient:
             endpoint = WudderClient.DEFAULT_GRAPHQL_ENDPOINT
         WudderClient._create_user_call(email, password, private_key, endpoint)
 
+    @classmethod
+    def _get_shared_graphql(cls, endpoint: str) -> GraphQL:
+        # Only for unauthenticated calls: the instance never gets a token
+        if endpoint not in cls._shared_graphql:
+            cls._shared_graphql[endpoint] = GraphQL(endpoint)
+        return cls._shared_graphql[endpoint]
+
     @retry
     def login(self, email: str, password: str) -> Dict:
         try:
@@ -42,7 +59,7 @@ class WudderClient:
         self._update_tokens(response['token'], response['refreshToken'])
         private_key = response['ethAccount']
         if private_key:
-            return json.loads(private_key)
+            return utils.json_loads(private_key)
 
     def update_private_key(self, private_key: dict) -> Dict:
         private_key_str = utils.ordered_stringify(private_key)
@@ -53,283 +70,249 @@ class WudderClient:
         response = self._send_event_directly_call(title, event.dict)
         return response['evhash']
 
+    def send_events_directly(self,
+                             items: list,
+                             max_workers: int = MAX_WORKERS) -> list:
+        chunks = self._get_items_chunks(items)
+        if len(chunks) > 1 and max_workers > 1:
+            # The batches are sent concurrently, map keeps their order
+            with ThreadPoolExecutor(min(max_workers, len(chunks))) as executor:
+                chunks_responses = list(
+                    executor.map(self._send_events_chunk, chunks))
+        else:
+            chunks_responses = map(self._send_events_chunk, chunks)
+        return WudderClient._get_evhashes(chunks, chunks_responses)
+
     def prepare(self, title: str, event: Event) -> Dict:
         response = self._prepare_call(title, event.dict)
-        output_data = {
-            'tx': json.loads(response['formattedTransaction']),
-            'event': Event(event_dict=json.loads(response['preparedContent'])),
-            'hash': response['hash'],
-            'url': response['url'],
-        }
-        return output_data
+        return WudderClient._format_prepared(response, response['hash'])
 
     def get_prepared(self, tmp_hash: str) -> Dict:
         try:
             response = self._get_prepared_call(tmp_hash)
         except exceptions.NotFoundError:
             return None
-        output_data = {
-            'tx': json.loads(response['formattedTransaction']),
-            'event': Event(event_dict=json.loads(response['preparedContent'])),
-            'hash': tmp_hash,
-            'url': response['url'],
-        }
-        return output_data
-
-    def send_prepared(self, tx: dict, signature: str = None) -> str:
-        tx_str = utils.ordered_stringify(tx)
+        return WudderClient._format_prepared(response, tmp_hash)
+
+    def send_prepared(self,
+                      tx: Union[dict, str],
+                      signature: str = None) -> str:
+        # Already stringified transactions are sent verbatim
+        tx_str = tx if isinstance(tx, str) else utils.ordered_stringify(tx)
         response = self._send_prepared_call(tx_str, signature)
         return response['evhash']
 
     def get_event(self, evhash: str) -> Dict:
-        try:
-            response = self._get_event_call(evhash)
-        except exceptions.NotFoundError:
-            return None
-        event_dict = {
-            'event': json.loads(response['originalContent'])['content']
-        }
-        if 'graphnData' in response:
-            event_dict.update(json.loads(response['graphnData']))
-        return event_dict
+        response = self._event_cache.get(evhash)
+        if response is None:
+            try:
+                response = self._single_flight(('evidence', evhash),
+                                               self._get_event_call, evhash)
+            except exceptions.NotFoundError:
+                return None
+            self._cache_event(evhash, response)
+        return WudderClient._format_event(response, evhash)
+
+    def get_events(self, evhashes: list) -> list:
+        responses, missing = self._get_cached_events(evhashes)
+        for chunk in utils.chunks(missing, self.MAX_BATCH_SIZE):
+            self._add_events(responses, chunk, self._get_events_call(chunk))
+        return WudderClient._format_events(responses, evhashes)
+
+    def get_proof(self, evhash: str) -> Proof:
+        graphn_data = self._get_cached_graphn_data(evhash)
+        if graphn_data is None:
+            # Only graphnData is requested, and it is parsed on first read
+            try:
+                graphn_data = self._get_proof_call(evhash)
+            except exceptions.NotFoundError:
+                return None
+            if not graphn_data:
+                return None
+            self._proof_cache.set(evhash, graphn_data)
+        return Proof(graphn_data=graphn_data)
 
     def get_trace(self, evhash: str) -> Dict:
-        # TODO transform response as in get_event
-        raise NotImplementedError
-        # try:
-        #     response = self._get_trace_call(evhash)
-        # except exceptions.NotFoundError:
-        #     return None
-
-    def _loop_refresh(self):
-        while True:
-            time.sleep(900)
-            response = self._refresh_call()
-            self._update_tokens(response['token'], response['refreshToken'])
-
-    def _update_tokens(self, token: str, refresh_token: str):
-        self.refresh_token = refresh_token
-        self.graphql.set_headers({'x-jwt-token': token})
-
-    @staticmethod
-    def _manage_errors(errors: list):
-        if not errors:
+        response = self._trace_cache.get(evhash)
+        if response is None:
+            try:
+                response = self._single_flight(('trace', evhash),
+                                               self._get_trace_call, evhash)
+            except exceptions.NotFoundError:
+                return None
+            self._cache_trace(evhash, response)
+        return WudderClient._format_trace(response, evhash)
+
+    def iter_trace(self, evhash: str, page_size: int = 50):
+        # Only the child evhashes are fetched upfront, the events are
+        # requested page by page as the iteration reaches them
+        try:
+            evhashes = self._get_trace_evhashes_call(evhash)
+        except exceptions.NotFoundError:
             return
-
+        for chunk in utils.chunks(evhashes, page_size):
+            for event in self.get_events(chunk):
+                # Children that cannot be read anymore are skipped
+                if event is not None:
+                    yield event
+
+    def _send_events_chunk(self, chunk: list) -> list:
+        # A failing batch must not discard the evhashes of the others
         try:
-            if errors[0]['code'] == 429:
-                raise exceptions.RateLimitExceededError(errors[0])
-
-            if errors[0]['code'] == 404:
-                raise exceptions.NotFoundError(errors[0])
-
-            if errors[0]['code'] == 401:
-                raise exceptions.AuthError(errors[0])
-
-            if errors[0]['code'] == 400:
-                raise exceptions.BadRequestError(errors[0])
-
-            if errors[0]['code'] == 440:
-                raise exceptions.AuthError(errors[0])
+            return self._send_events_directly_call(chunk)
+        except Exception as error:
+            return error
+
+    def _single_flight(self, key: tuple, method, *args):
+        # Identical concurrent calls wait for the one already in flight
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                leader = False
+            else:
+                leader = True
+                future = self._inflight[key] = Future()
+        if not leader:
+            return future.result()
 
-        except KeyError:
-            pass
+        try:
+            result = method(*args)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def _refresh(self, stale_token: str):
+        # Single-flight: whoever gets the lock first refreshes, the rest
+        # find the token already replaced and reuse it
+        with self._refresh_lock:
+            if self._token != stale_token:
+                return
+            response = self._refresh_call()
+            self._update_tokens(response['token'], response['refreshToken'])
 
-        raise exceptions.UnexpectedError(errors[0])
+    def _schedule_refresh(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+        self._refresh_timer = Timer(self.REFRESH_INTERVAL,
+                                    self._refresh,
+                                    args=(self._token, ))
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _execute(self, query: str, variables: dict):
+        token = self._token
+        data, errors = self.graphql.execute(query, variables)
+        if self._is_auth_error(errors) and self.refresh_token is not None:
+            self._refresh(token)
+            data, errors = self.graphql.execute(query, variables)
+        return data, errors
 
     @staticmethod
-    @retry
+    @retry(retriable=MUTATION_RETRIABLE_ERRORS)
     def _create_user_call(email: str, password: str, private_key: str,
                           endpoint: str) -> Dict:
-        mutation = '''
-            mutation CreateUser($user: UserInput!, $password: String!){
-                createUser(user: $user, password: $password) {
-                    id
-                }
-            }
-        '''
-        variables = {
-            'user': {
-                'email': email,
-                'ethAccount': utils.ordered_stringify(private_key)
-            },
-            'password': password
-        }
-        data, errors = GraphQL(endpoint).execute(mutation, variables)
+        variables = WudderClient._create_user_variables(
+            email, password, private_key)
+        graphql = WudderClient._get_shared_graphql(endpoint)
+        data, errors = graphql.execute(queries.CREATE_USER, variables)
         WudderClient._manage_errors(errors)
         return data['createUser']
 
     @retry
     def _login_call(self, email: str, password: str) -> Dict:
-        mutation = '''
-            mutation Login($email: String!, $password: String!) {
-                login(email: $email, password: $password){
-                    token
-                    refreshToken
-                    ethAccount
-                }
-            }
-        '''
-        variables = {
-            'email': email,
-            'password': password,
-        }
-        data, errors = self.graphql.execute(mutation, variables)
+        variables = WudderClient._login_variables(email, password)
+        data, errors = self.graphql.execute(queries.LOGIN, variables)
         WudderClient._manage_errors(errors)
         return data['login']
 
     @retry
     def _refresh_call(self) -> Dict:
-        mutation = '''
-            mutation RefreshToken($refreshToken: String!) {
-                refreshToken(token: $refreshToken){
-                    token
-                    refreshToken
-                }
-            }
-        '''
-        variables = {
-            'refreshToken': self.refresh_token,
-        }
-        data, errors = self.graphql.execute(mutation, variables)
+        variables = self._refresh_variables()
+        data, errors = self.graphql.execute(queries.REFRESH_TOKEN, variables)
         WudderClient._manage_errors(errors)
         return data['refreshToken']
 
-    @retry
+    @retry(retriable=MUTATION_RETRIABLE_ERRORS)
     def _update_private_key_call(self, private_key: str) -> Dict:
-        mutation = '''
-            mutation UpdateUser($user: UserInput!){
-                updateUser(user: $user) {
-                    ethAccount
-                }
-            }
-        '''
-        variables = {
-            'user': {
-                'ethAccount': private_key
-            },
-        }
-        data, errors = self.graphql.execute(mutation, variables)
+        variables = WudderClient._update_private_key_variables(private_key)
+        data, errors = self._execute(queries.UPDATE_USER, variables)
         WudderClient._manage_errors(errors)
         return data['updateUser']
 
-    @retry
+    @retry(retriable=MUTATION_RETRIABLE_ERRORS)
     def _send_event_directly_call(self, title: str, event: dict) -> Dict:
-        mutation = '''
-            mutation CreateEvidence($evidence: EvidenceInput!, $displayName: String!){
-                createEvidence(evidence: $evidence, displayName: $displayName){
-                    evhash
-                }
-            }
-        '''
-        variables = {
-            'displayName': title,
-            'evidence': {
-                'content': event
-            },
-        }
-        data, errors = self.graphql.execute(mutation, variables)
+        variables = WudderClient._send_event_directly_variables(title, event)
+        data, errors = self._execute(queries.CREATE_EVIDENCE, variables)
         WudderClient._manage_errors(errors)
         return data['createEvidence']
 
+    # Events failing on their own come back as their exception
+    @retry(retriable=MUTATION_RETRIABLE_ERRORS)
+    def _send_events_directly_call(self, items: list) -> list:
+        variables = WudderClient._send_events_directly_variables(items)
+        data, errors = self._execute(queries.bulk_create_evidence(len(items)),
+                                     variables)
+        return WudderClient._split_responses(data, errors, len(items))
+
     @retry
     def _prepare_call(self, title: str, event: dict) -> Dict:
-        mutation = '''
-            mutation PrepareEvidence($content: ContentInput!, $displayName: String!){
-                prepareEvidence(content: $content, displayName: $displayName){
-                    formattedTransaction
-                    preparedContent
-                    hash
-                    url
-                }
-            }
-        '''
-        variables = {'displayName': title, 'content': event}
-        data, errors = self.graphql.execute(mutation, variables)
+        variables = WudderClient._prepare_variables(title, event)
+        data, errors = self._execute(queries.PREPARE_EVIDENCE, variables)
         WudderClient._manage_errors(errors)
         return data['prepareEvidence']
 
-    @retry
+    @retry(retriable=MUTATION_RETRIABLE_ERRORS)
     def _send_prepared_call(self, tx: str, signature: str) -> str:
-        mutation = '''
-            mutation ConfirmPreparedEvidence($evidence: PreparedEvidenceInput!){
-                confirmPreparedEvidence(evidence: $evidence){
-                    evhash
-                }
-            }
-        '''
-        variables = {
-            'evidence': {
-                'preparedEvidence': tx,
-                'signature': signature
-            },
-        }
-        data, errors = self.graphql.execute(mutation, variables)
+        variables = WudderClient._send_prepared_variables(tx, signature)
+        data, errors = self._execute(queries.CONFIRM_PREPARED_EVIDENCE,
+                                     variables)
         WudderClient._manage_errors(errors)
         return data['confirmPreparedEvidence']
 
     @retry
     def _get_prepared_call(self, tmp_hash: str) -> Dict:
-        query = '''
-            query PreparedEvidence($hash: String!){
-                preparedEvidence(hash: $hash){
-                    formattedTransaction
-                    preparedContent
-                    url
-                }
-            }
-        '''
-        variables = {
-            'hash': tmp_hash,
-        }
-        data, errors = self.graphql.execute(query, variables)
+        variables = WudderClient._get_prepared_variables(tmp_hash)
+        data, errors = self._execute(queries.PREPARED_EVIDENCE, variables)
         WudderClient._manage_errors(errors)
         return data['preparedEvidence']
 
     @retry
     def _get_event_call(self, evhash: str) -> Event:
-        query = '''
-            query Evidence($evhash: String!){
-                evidence(evhash: $evhash){
-                    graphnData
-                    type
-                    displayName
-                    originalContent
-                }
-            }
-        '''
-        variables = {
-            'evhash': evhash,
-        }
-        data, errors = self.graphql.execute(query, variables)
+        variables = WudderClient._evhash_variables(evhash)
+        data, errors = self._execute(queries.EVIDENCE, variables)
         WudderClient._manage_errors(errors)
         return data['evidence']
 
+    @retry
+    def _get_events_call(self, evhashes: list) -> list:
+        variables = WudderClient._evhashes_variables(evhashes)
+        data, errors = self._execute(queries.bulk_evidence(len(evhashes)),
+                                     variables)
+        return WudderClient._demux_responses(data, errors, len(evhashes))
+
+    @retry
+    def _get_proof_call(self, evhash: str) -> str:
+        variables = WudderClient._evhash_variables(evhash)
+        data, errors = self._execute(queries.GRAPHN_DATA, variables)
+        WudderClient._manage_errors(errors)
+        return data['evidence']['graphnData']
+
+    @retry
+    def _get_trace_evhashes_call(self, evhash: str) -> list:
+        variables = WudderClient._evhash_variables(evhash)
+        data, errors = self._execute(queries.TRACE_EVHASHES, variables)
+        WudderClient._manage_errors(errors)
+        return WudderClient._get_child_evhashes(data['trace'])
+
     @retry
     def _get_trace_call(self, evhash: str) -> Dict:
-        query = '''
-            query GetTrace($evhash: String!){
-                trace(evhash: $evhash){
-                    creationEvidence {
-                        evhash
-                        type
-                        graphnData
-                        displayName
-                        originalContent
-                    }
-                    childs {
-                        evhash
-                        type
-                        graphnData
-                        displayName
-                        originalContent
-                    }
-                }
-            }
-        '''
-        variables = {
-            'evhash': evhash,
-        }
-        data, errors = self.graphql.execute(query, variables)
+        variables = WudderClient._evhash_variables(evhash)
+        data, errors = self._execute(queries.TRACE, variables)
         WudderClient._manage_errors(errors)
-        return data['getTrace']
+        return data['trace']
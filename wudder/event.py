@@ -16,6 +16,7 @@ class EventTypes:
 class Fragment:
     VISIBILITY_PUBLIC = 'public'
     VISIBILITY_PRIVATE = 'private'
+    __slots__ = ('field', 'value', 'visibility', 'salt')
 
     def __init__(self,
                  field: str = None,
@@ -69,6 +70,9 @@ class Fragment:
 
 
 class Event:
+    __slots__ = ('_fragments', '_fragment_dicts', 'trace', 'type', 'timestamp',
+                 'salt', 'proof')
+
     def __init__(self,
                  fragments: list = None,
                  trace: str = None,
@@ -99,7 +103,7 @@ class Event:
     @property
     def fragments(self) -> list:
         fragments = []
-        for fragment in self._fragments:
+        for fragment in self._get_fragments():
             fragments.append(Fragment(fragment_dict=fragment.dict))
         return fragments
 
@@ -130,6 +134,16 @@ class Event:
             if not isinstance(fragment, Fragment):
                 raise TypeError
         self._fragments = fragments
+        self._fragment_dicts = None
+
+    def _get_fragments(self) -> list:
+        # Fragments loaded from a dict are only built when first read
+        if self._fragments is None:
+            self._set_fragments([
+                Fragment(fragment_dict=fragment)
+                for fragment in self._fragment_dicts
+            ])
+        return self._fragments
 
     def _set_trace(self, trace: str):
         if trace is None:
@@ -137,9 +151,8 @@ class Event:
         self.trace = trace
 
     def _load_event_dict(self, event: dict):
-        self._set_fragments([
-            Fragment(fragment_dict=fragment) for fragment in event['fragments']
-        ])
+        self._fragments = None
+        self._fragment_dicts = event['fragments']
         self._set_trace(event['trace'])
         self.type = event['type']
 
@@ -158,7 +171,7 @@ class Event:
     @property
     def dict(self) -> dict:
         fragments = []
-        for fragment in self.fragments:
+        for fragment in self._get_fragments():
             fragments.append(fragment.dict)
 
         event_dict = {
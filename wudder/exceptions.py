@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from typing import Optional
+
 
 class AuthError(Exception):
     pass
@@ -15,7 +17,26 @@ class SignupError(Exception):
 
 
 class RateLimitExceededError(Exception):
-    pass
+    @property
+    def retry_after(self) -> Optional[float]:
+        # Seconds, taken from the error or the Retry-After header
+        try:
+            return float(self.args[0]['retryAfter'])
+        except (IndexError, KeyError, TypeError, ValueError):
+            return None
+
+
+class BatchError(Exception):
+    # Some events of a batch could not be created
+    @property
+    def evhashes(self) -> list:
+        # In the order of the batch, None for the events that failed
+        return self.args[0]
+
+    @property
+    def errors(self) -> dict:
+        # The exception of every failed event, by its index in the batch
+        return self.args[1]
 
 
 class UnexpectedError(Exception):
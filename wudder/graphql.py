@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from . import utils
+import gzip
+import hashlib
+import httpx
+
+MAX_CONNECTIONS = 20
+ASYNC_MAX_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 75
+TIMEOUT = 60
+HEADERS = {'Content-Type': 'application/json'}
+COMPRESSION_THRESHOLD = 1024
+COMPRESSION_LEVEL = 1
+MAX_ENCODED_OPERATIONS = 256
+
+# Automatic persisted queries (APQ)
+QUERY = 'query'
+PERSIST_QUERY = 'persist'
+PERSISTED_QUERY = 'persisted'
+PERSISTED_QUERY_NOT_FOUND = ('PersistedQueryNotFound',
+                             'PERSISTED_QUERY_NOT_FOUND')
+PERSISTED_QUERY_NOT_SUPPORTED = ('PersistedQueryNotSupported',
+                                 'PERSISTED_QUERY_NOT_SUPPORTED')
+
+_encoded_operations = {}
+
+
+def create_client() -> httpx.Client:
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS,
+                          max_keepalive_connections=MAX_CONNECTIONS,
+                          keepalive_expiry=KEEPALIVE_EXPIRY)
+    return httpx.Client(http2=True,
+                        limits=limits,
+                        timeout=TIMEOUT,
+                        headers=HEADERS)
+
+
+def create_async_client() -> httpx.AsyncClient:
+    # With HTTP/2 concurrent requests are multiplexed over one connection,
+    # the rest of the pool is only used by HTTP/1.1 servers
+    limits = httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS,
+                          max_keepalive_connections=ASYNC_MAX_CONNECTIONS,
+                          keepalive_expiry=KEEPALIVE_EXPIRY)
+    return httpx.AsyncClient(http2=True,
+                             limits=limits,
+                             timeout=TIMEOUT,
+                             headers=HEADERS)
+
+
+def encode_request(operation: str,
+                   variables: dict = None,
+                   mode: str = QUERY) -> bytes:
+    # Operations are constants, so their escaped JSON is built only once
+    # and the variables are serialised straight after it
+    encoded_operation = _encoded_operations.get((operation, mode))
+    if encoded_operation is None:
+        encoded_operation = utils.json_dumps(
+            get_request_envelope(operation, mode))[:-1]
+        if len(_encoded_operations) < MAX_ENCODED_OPERATIONS:
+            _encoded_operations[(operation, mode)] = encoded_operation
+
+    if variables is None:
+        return encoded_operation + b'}'
+    return b''.join((encoded_operation, b',"variables":',
+                     utils.json_dumps(variables), b'}'))
+
+
+def get_request_envelope(operation: str, mode: str) -> dict:
+    if mode == QUERY:
+        return {'query': operation}
+
+    sha256_hash = hashlib.sha256(operation.encode('utf-8')).hexdigest()
+    extensions = {'persistedQuery': {'version': 1, 'sha256Hash': sha256_hash}}
+    if mode == PERSISTED_QUERY:
+        return {'extensions': extensions}
+    return {'query': operation, 'extensions': extensions}
+
+
+def is_persisted_query_error(errors: list, error_names: tuple) -> bool:
+    if not errors:
+        return False
+    error = errors[0]
+    if error.get('message') in error_names:
+        return True
+    extensions = error.get('extensions') or {}
+    return extensions.get('code') in error_names
+
+
+def compress(content: bytes, headers: dict):
+    # Level 1 is close to a copy in speed and already shrinks JSON a lot
+    compressed_headers = dict(headers)
+    compressed_headers['Content-Encoding'] = 'gzip'
+    return gzip.compress(content, COMPRESSION_LEVEL), compressed_headers
+
+
+def parse_response(response: httpx.Response):
+    response_dict = utils.json_loads(response.content)
+    errors = response_dict.get('errors')
+    if errors and response.status_code == 429:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            for error in errors:
+                error.setdefault('retryAfter', retry_after)
+    return response_dict.get('data'), errors
+
+
+# Shared by every client so the TLS connections are reused between calls
+CLIENT = create_client()
+
+
+class BaseGraphQL:
+    def __init__(self, endpoint: str, persisted_queries: bool = False):
+        self.endpoint = endpoint
+        self._headers = {}
+        self._compression = True
+        self._persisted_queries = persisted_queries
+        self._persisted_operations = set()
+
+    def set_headers(self, headers: dict):
+        self._headers = headers
+
+    def _get_mode(self, operation: str) -> str:
+        if not self._persisted_queries:
+            return QUERY
+        # Once registered, only the hash of the operation is sent
+        if operation in self._persisted_operations:
+            return PERSISTED_QUERY
+        return PERSIST_QUERY
+
+    def _get_next_mode(self, operation: str, mode: str, errors: list) -> str:
+        # The mode to send the operation again with, None when it is done
+        if mode == QUERY:
+            return None
+
+        # Servers without APQ may reject the extension even with the query
+        if is_persisted_query_error(errors, PERSISTED_QUERY_NOT_SUPPORTED):
+            self._persisted_queries = False
+            return QUERY
+
+        if mode == PERSISTED_QUERY:
+            if is_persisted_query_error(errors, PERSISTED_QUERY_NOT_FOUND):
+                self._persisted_operations.discard(operation)
+                return PERSIST_QUERY
+            return None
+
+        # Only operations the server has accepted are sent as a hash later
+        if not errors and \
+                len(self._persisted_operations) < MAX_ENCODED_OPERATIONS:
+            self._persisted_operations.add(operation)
+        return None
+
+    def _compress(self, content: bytes, headers: dict):
+        if self._compression and len(content) > COMPRESSION_THRESHOLD:
+            return compress(content, headers)
+        return None
+
+    def _is_compression_rejected(self, response: httpx.Response) -> bool:
+        if response.status_code != 415:
+            return False
+        # The server does not accept compressed bodies
+        self._compression = False
+        return True
+
+
+class GraphQL(BaseGraphQL):
+    def __init__(self,
+                 endpoint: str,
+                 client: httpx.Client = None,
+                 persisted_queries: bool = False):
+        super().__init__(endpoint, persisted_queries)
+        self._client = CLIENT if client is None else client
+
+    def execute(self,
+                operation: str,
+                variables: dict = None,
+                headers: dict = None):
+        if headers is None:
+            headers = self._headers
+
+        mode = self._get_mode(operation)
+        while mode is not None:
+            data, errors = self._post(
+                encode_request(operation, variables, mode), headers)
+            mode = self._get_next_mode(operation, mode, errors)
+        return data, errors
+
+    def _post(self, content: bytes, headers: dict):
+        compressed = self._compress(content, headers)
+        if compressed is not None:
+            compressed_content, compressed_headers = compressed
+            response = self._client.post(self.endpoint,
+                                         content=compressed_content,
+                                         headers=compressed_headers)
+            if not self._is_compression_rejected(response):
+                return parse_response(response)
+
+        response = self._client.post(self.endpoint,
+                                     content=content,
+                                     headers=headers)
+        return parse_response(response)
+
+
+class AsyncGraphQL(BaseGraphQL):
+    def __init__(self, endpoint: str, persisted_queries: bool = False):
+        super().__init__(endpoint, persisted_queries)
+        self._client = None
+
+    async def execute(self,
+                      operation: str,
+                      variables: dict = None,
+                      headers: dict = None):
+        if headers is None:
+            headers = self._headers
+
+        mode = self._get_mode(operation)
+        while mode is not None:
+            data, errors = await self._post(
+                encode_request(operation, variables, mode), headers)
+            mode = self._get_next_mode(operation, mode, errors)
+        return data, errors
+
+    async def _post(self, content: bytes, headers: dict):
+        compressed = self._compress(content, headers)
+        if compressed is not None:
+            compressed_content, compressed_headers = compressed
+            response = await self._get_client().post(
+                self.endpoint,
+                content=compressed_content,
+                headers=compressed_headers)
+            if not self._is_compression_rejected(response):
+                return parse_response(response)
+
+        response = await self._get_client().post(self.endpoint,
+                                                 content=content,
+                                                 headers=headers)
+        return parse_response(response)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created on first use, inside the event loop that will drive it
+        if self._client is None:
+            self._client = create_async_client()
+        return self._client
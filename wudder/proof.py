@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from . import utils
+
+
+class Proof:
+    __slots__ = ('_graphn_data', '_proof_data')
+
+    def __init__(self, graphn_data: str):
+        # The raw graphnData is only parsed when the proof is first read
+        self._graphn_data = graphn_data
+        self._proof_data = None
+
+    def __getitem__(self, key: str):
+        return self.dict[key]
+
+    @property
+    def proof(self) -> str:
+        return self.dict['proof']
+
+    @property
+    def l1_suffixes(self) -> dict:
+        return self.dict.get('l1_suffixes')
+
+    @property
+    def dict(self) -> dict:
+        if self._proof_data is None:
+            self._proof_data = utils.json_loads(
+                self._graphn_data)['proof_data']
+            self._graphn_data = None
+        return self._proof_data
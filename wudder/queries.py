@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from functools import lru_cache
+import re
+
+
+def minify(operation: str) -> str:
+    operation = ' '.join(operation.split())
+    return re.sub(r' ?([{}():,!$]) ?', r'\1', operation)
+
+
+CREATE_USER = minify('''
+    mutation CreateUser($user: UserInput!, $password: String!){
+        createUser(user: $user, password: $password) {
+            id
+        }
+    }
+''')
+
+LOGIN = minify('''
+    mutation Login($email: String!, $password: String!) {
+        login(email: $email, password: $password){
+            token
+            refreshToken
+            ethAccount
+        }
+    }
+''')
+
+REFRESH_TOKEN = minify('''
+    mutation RefreshToken($refreshToken: String!) {
+        refreshToken(token: $refreshToken){
+            token
+            refreshToken
+        }
+    }
+''')
+
+UPDATE_USER = minify('''
+    mutation UpdateUser($user: UserInput!){
+        updateUser(user: $user) {
+            ethAccount
+        }
+    }
+''')
+
+CREATE_EVIDENCE = minify('''
+    mutation CreateEvidence($evidence: EvidenceInput!, $displayName: String!){
+        createEvidence(evidence: $evidence, displayName: $displayName){
+            evhash
+        }
+    }
+''')
+
+PREPARE_EVIDENCE = minify('''
+    mutation PrepareEvidence($content: ContentInput!, $displayName: String!){
+        prepareEvidence(content: $content, displayName: $displayName){
+            formattedTransaction
+            preparedContent
+            hash
+            url
+        }
+    }
+''')
+
+CONFIRM_PREPARED_EVIDENCE = minify('''
+    mutation ConfirmPreparedEvidence($evidence: PreparedEvidenceInput!){
+        confirmPreparedEvidence(evidence: $evidence){
+            evhash
+        }
+    }
+''')
+
+PREPARED_EVIDENCE = minify('''
+    query PreparedEvidence($hash: String!){
+        preparedEvidence(hash: $hash){
+            formattedTransaction
+            preparedContent
+            url
+        }
+    }
+''')
+
+EVIDENCE = minify('''
+    query Evidence($evhash: String!){
+        evidence(evhash: $evhash){
+            graphnData
+            type
+            displayName
+            originalContent
+        }
+    }
+''')
+
+GRAPHN_DATA = minify('''
+    query GraphnData($evhash: String!){
+        evidence(evhash: $evhash){
+            graphnData
+        }
+    }
+''')
+
+TRACE = minify('''
+    query GetTrace($evhash: String!){
+        trace(evhash: $evhash){
+            creationEvidence {
+                evhash
+                type
+                graphnData
+                displayName
+                originalContent
+            }
+            childs {
+                evhash
+                type
+                graphnData
+                displayName
+                originalContent
+            }
+        }
+    }
+''')
+
+TRACE_EVHASHES = minify('''
+    query GetTraceEvhashes($evhash: String!){
+        trace(evhash: $evhash){
+            childs {
+                evhash
+            }
+        }
+    }
+''')
+
+EVIDENCE_FIELDS = 'evhash graphnData type displayName originalContent'
+
+
+def alias(index: int) -> str:
+    return f'e{index}'
+
+
+@lru_cache(maxsize=128)
+def merge(operation: str, name: str, field: str, arguments: tuple,
+          selection: str, count: int) -> str:
+    # Repeats a single root field under aliases e0, e1... so that all of
+    # them are resolved in one request. Arguments are (name, type) pairs
+    definitions = []
+    fields = []
+    for index in range(count):
+        field_arguments = []
+        for argument, argument_type in arguments:
+            definitions.append(f'${argument}{index}: {argument_type}')
+            field_arguments.append(f'{argument}: ${argument}{index}')
+        fields.append(
+            f'{alias(index)}: {field}({", ".join(field_arguments)}){{{selection}}}'
+        )
+    return minify(
+        f'{operation} {name}({", ".join(definitions)}){{{" ".join(fields)}}}')
+
+
+def merge_variables(variables_list: list) -> dict:
+    merged_variables = {}
+    for index, variables in enumerate(variables_list):
+        for key, value in variables.items():
+            merged_variables[f'{key}{index}'] = value
+    return merged_variables
+
+
+def bulk_evidence(count: int) -> str:
+    return merge('query', 'BulkEvidence', 'evidence',
+                 (('evhash', 'String!'), ), EVIDENCE_FIELDS, count)
+
+
+def bulk_create_evidence(count: int) -> str:
+    return merge('mutation', 'BulkCreateEvidence', 'createEvidence',
+                 (('evidence', 'EvidenceInput!'), ('displayName', 'String!')),
+                 'evhash', count)
@@ -1,42 +1,116 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import asyncio
 import hashlib
+import httpx
 import json
+import random
 from eth_account import Account as EthereumAccount
 from os import makedirs
 import time
 import requests
+from typing import Optional
+from . import exceptions
 from . import graphn
 from .event import Event, Fragment, EventTypes
 
-RETRY_ATTEMPTS = 2
-RETRY_INTERVAL = 1
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+RETRY_ATTEMPTS = 3
+RETRY_INTERVAL = 1
+RETRY_MAX_INTERVAL = 30
+# Deterministic failures (not found, bad request, auth) are not retried
+RETRIABLE_ERRORS = (
+    exceptions.RateLimitExceededError,
+    exceptions.UnexpectedError,
+    httpx.TransportError,
+    json.JSONDecodeError,
+)
+# Mutations are not idempotent: a request that may have reached the server
+# is not sent again, only rate limited ones and failed connections are
+MUTATION_RETRIABLE_ERRORS = (
+    exceptions.RateLimitExceededError,
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+)
+
+
+def get_retry_delay(attempt: int, error: Exception) -> Optional[float]:
+    # None when the server asks to wait longer than RETRY_MAX_INTERVAL, the
+    # error is raised then instead of blocking the call
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        return retry_after if retry_after <= RETRY_MAX_INTERVAL else None
+    # 1, 2, 4... seconds, randomised so that clients do not retry in step
+    delay = min(RETRY_MAX_INTERVAL, RETRY_INTERVAL * 2**attempt)
+    return delay * random.uniform(0.5, 1.5)
+
+
+def retry(method=None, retriable: tuple = RETRIABLE_ERRORS):
+    if method is None:
+        return lambda method: retry(method, retriable)
 
-def retry(method):
     def _try_except(self, *args, **kwargs):
-        remaining_attempts = RETRY_ATTEMPTS
-        while remaining_attempts > 1:
+        for attempt in range(RETRY_ATTEMPTS - 1):
             try:
                 return method(self, *args, **kwargs)
-            except Exception:
-                remaining_attempts -= 1
-                time.sleep(RETRY_INTERVAL)
+            except retriable as error:
+                delay = get_retry_delay(attempt, error)
+                if delay is None:
+                    raise
+                time.sleep(delay)
         return method(self, *args, **kwargs)
 
     return _try_except
 
 
+def async_retry(method=None, retriable: tuple = RETRIABLE_ERRORS):
+    if method is None:
+        return lambda method: async_retry(method, retriable)
+
+    async def _try_except(self, *args, **kwargs):
+        for attempt in range(RETRY_ATTEMPTS - 1):
+            try:
+                return await method(self, *args, **kwargs)
+            except retriable as error:
+                delay = get_retry_delay(attempt, error)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+        return await method(self, *args, **kwargs)
+
+    return _try_except
+
+
 def sha3_512(text: str) -> str:
     return hashlib.sha3_512(text.encode('utf-8')).hexdigest()
 
 
+def json_loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def json_dumps(obj) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson rejects big integers, non-str keys and lone surrogates
+            pass
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
 def ordered_stringify(unordered_dict: dict) -> str:
-    keys = sorted(list(unordered_dict.keys()))
-    new_dict = dict()
-    for key in keys:
-        new_dict[key] = unordered_dict[key]
+    # Always the json module: the output is hashed and signed, so it must not
+    # depend on orjson being installed (e.g. it writes 1e16 instead of 1e+16)
+    new_dict = {key: unordered_dict[key] for key in sorted(unordered_dict)}
     return json.dumps(new_dict, separators=(',', ':'), ensure_ascii=False)
 
 
@@ -76,6 +150,11 @@ def generate_private_key(password: str) -> dict:
     return private_key_dict
 
 
+def chunks(items: list, size: int):
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
 def get_timestamp_ms() -> int:
     return int(round(time.time() * 1000))
 
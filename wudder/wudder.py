@@ -5,6 +5,7 @@ from . import utils
 from . import graphn
 from .event import Event, Fragment, EventTypes
 from .client import WudderClient
+from .proof import Proof
 from . import exceptions
 from digsig import PrivateKey, EcdsaPrivateKey, EcdsaFormats, EcdsaModes
 from digsig.errors import InvalidSignatureError
@@ -32,7 +33,8 @@ class Wudder:
                  private_key_password: str = None,
                  private_key_path: str = None,
                  endpoint: str = None,
-                 ethereum_endpoint: str = None):
+                 ethereum_endpoint: str = None,
+                 persisted_queries: bool = False):
         self._private_key = None
         if private_key is not None:
             self._private_key = PrivateKey.get_instance(
@@ -47,7 +49,8 @@ class Wudder:
                 mode=private_key_mode,
                 key_format=private_key_format,
             )
-        self._wudder_client = WudderClient(email, password, endpoint)
+        self._wudder_client = WudderClient(
+            email, password, endpoint, persisted_queries=persisted_queries)
         self._login(email, password, private_key_password)
         if ethereum_endpoint is None:
             self._ethereum_endpoint = self.DEFAULT_ETHEREUM_ENDPOINT
@@ -77,9 +80,21 @@ class Wudder:
     def get_event(self, evhash: str) -> Dict:
         return self._wudder_client.get_event(evhash)
 
+    def get_proof(self, evhash: str) -> Proof:
+        return self._wudder_client.get_proof(evhash)
+
+    def get_events(self, evhashes: list) -> list:
+        return self._wudder_client.get_events(evhashes)
+
     def get_trace(self, evhash: str) -> Dict:
         return self._wudder_client.get_trace(evhash)
 
+    def iter_trace(self, evhash: str, page_size: int = 50):
+        return self._wudder_client.iter_trace(evhash, page_size)
+
+    def invalidate(self, evhash: str):
+        self._wudder_client.invalidate(evhash)
+
     def prepare(self, title: str, fragments: Dict, trace: str = None) -> Dict:
         event_type = EventTypes.TRACE if trace is None else EventTypes.ADD_EVENT
         fragments = [Fragment(**fragment) for fragment in fragments]
@@ -93,12 +108,13 @@ class Wudder:
                       tx: Dict,
                       full_signature=True,
                       sighash_signature=False) -> str:
+        tx_str = utils.ordered_stringify(tx)
         signature = None
         if full_signature:
-            signature = self._get_signature(tx)
+            signature = self._get_signature(tx_str)
         if sighash_signature:
-            signature = self._get_sighash(tx)
-        evhash = self._wudder_client.send_prepared(tx, signature)
+            signature = self._get_sighash(tx_str)
+        evhash = self._wudder_client.send_prepared(tx_str, signature)
         return evhash
 
     def check_ethereum_proof(self, graphn_proof: str, anchor_tx: str) -> bool:
@@ -140,13 +156,12 @@ class Wudder:
         stored_private_key = utils.generate_private_key(private_key_password)
         self._wudder_client.update_private_key(stored_private_key)
 
-    def _get_signature(self, tx: dict) -> str:
-        tx_str = utils.ordered_stringify(tx)
+    def _get_signature(self, tx_str: str) -> str:
         signature = self._private_key.sign(tx_str).hex()
         return signature
 
-    def _get_sighash(self, tx: dict) -> str:
-        signature = self._get_signature(tx)
+    def _get_sighash(self, tx_str: str) -> str:
+        signature = self._get_signature(tx_str)
         sighash = utils.sha3_512(signature)
         return sighash
 
@@ -159,17 +174,17 @@ class Wudder:
             raise ValueError(
                 f"event mismatch\n{event.dict}\nvs.\n{result['event'].dict}")
 
-        tx = utils.get_event_tx(result['event'])
-        if utils.ordered_stringify(result['tx']) != utils.ordered_stringify(tx):
-            raise ValueError(
-                f"tx mismatch\n{utils.ordered_stringify(result['tx'])}\nvs.\n{utils.ordered_stringify(tx)}"
-            )
+        # The same string is compared, signed and sent
+        tx_str = utils.ordered_stringify(utils.get_event_tx(result['event']))
+        received_tx_str = utils.ordered_stringify(result['tx'])
+        if received_tx_str != tx_str:
+            raise ValueError(f"tx mismatch\n{received_tx_str}\nvs.\n{tx_str}")
 
         signature = None
         if full_signature:
-            signature = self._get_signature(tx)
+            signature = self._get_signature(tx_str)
         if sighash_signature:
-            signature = self._get_sighash(tx)
+            signature = self._get_sighash(tx_str)
 
-        evhash = self._wudder_client.send_prepared(tx, signature)
+        evhash = self._wudder_client.send_prepared(tx_str, signature)
         return evhash